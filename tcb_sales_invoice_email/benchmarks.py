@@ -0,0 +1,107 @@
+import os
+import random
+import resource
+import time
+import tracemalloc
+
+import frappe
+from frappe.utils import add_days, getdate, today
+
+from tcb_sales_invoice_email.tasks import (
+	get_most_overdue_invoices,
+	get_overdue_invoice_attachment,
+	get_overdue_invoice_table,
+)
+
+
+def benchmark_large_statement(rows=50000):
+	"""
+	Benchmark the overdue statement for a customer with a large number of open invoices.
+
+	Compares the full inline HTML table with large-statement mode (truncated table plus
+	CSV attachment) and reports duration, peak traced memory and output size of each,
+	plus the peak resident memory of the process.
+
+	Run with:
+	    bench --site <site> execute tcb_sales_invoice_email.benchmarks.benchmark_large_statement --kwargs "{'rows': 50000}"
+	"""
+	invoices = get_synthetic_overdue_invoices(int(rows))
+	total_outstanding = sum(inv["outstanding_amount"] for inv in invoices)
+
+	results = {
+		"full_table": measure(lambda: get_overdue_invoice_table(invoices)),
+		"truncated_table": measure(
+			lambda: get_overdue_invoice_table(
+				get_most_overdue_invoices(invoices),
+				total_outstanding=total_outstanding,
+				total_invoices=len(invoices),
+			)
+		),
+		"csv_attachment": measure(lambda: get_attachment_size(invoices)),
+	}
+	frappe.db.rollback()
+
+	for name, result in results.items():
+		print(
+			f"{name}: {result['seconds']:.3f}s, peak memory {result['peak_mb']:.1f} MB, "
+			f"output {result['output_mb']:.1f} MB"
+		)
+
+	peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+	print(f"process peak resident memory: {peak_rss_mb:.1f} MB")
+
+	return results
+
+
+def get_attachment_size(invoices):
+	"""Write the CSV attachment for `invoices` and return its size on disk, then delete it"""
+	file_doc = frappe.get_doc("File", get_overdue_invoice_attachment("Benchmark Customer", invoices)["fid"])
+	file_path = file_doc.get_full_path()
+	size = os.path.getsize(file_path)
+	os.remove(file_path)
+	return size
+
+
+def measure(fn):
+	"""
+	Run `fn` once and return its duration, peak traced memory and output size.
+	`fn` returns either its output or the output size in bytes.
+	"""
+	tracemalloc.start()
+	start = time.perf_counter()
+	output = fn()
+	seconds = time.perf_counter() - start
+	_, peak = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	return {
+		"seconds": seconds,
+		"peak_mb": peak / 1024 / 1024,
+		"output_mb": (output if isinstance(output, int) else len(output)) / 1024 / 1024,
+	}
+
+
+def get_synthetic_overdue_invoices(rows):
+	"""Generate overdue invoice rows shaped like the ones built in `get_customer_overdue_invoices`"""
+	rng = random.Random(rows)
+	invoices = []
+
+	for idx in range(rows):
+		days_overdue = rng.randint(1, 365)
+		grand_total = round(rng.uniform(100, 100000), 2)
+		due_date = add_days(today(), -days_overdue)
+
+		invoices.append(
+			{
+				"name": f"ACC-SINV-BENCH-{idx:06d}",
+				"po_no": f"PO-{idx:06d}",
+				"posting_date": getdate(add_days(due_date, -30)),
+				"due_date": getdate(due_date),
+				"rounded_total": grand_total,
+				"grand_total": grand_total,
+				"outstanding_amount": round(grand_total * rng.uniform(0.1, 1), 2),
+				"days_overdue": days_overdue,
+			}
+		)
+
+	return invoices
@@ -0,0 +1,29 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("delivery-email-load-test")
+@click.option("--invoices", default=100, help="Number of synthetic Sales Invoices to seed")
+@click.option("--customers", default=10, help="Number of synthetic customers to spread invoices over")
+@click.option("--port", default=8025, help="Port of the local SMTP sink")
+@click.option("--timeout", default=600, help="Seconds to wait for the email queue to drain")
+@click.option("--keep", is_flag=True, default=False, help="Keep the seeded documents after the run")
+@pass_context
+def delivery_email_load_test(context, invoices, customers, port, timeout, keep):
+	"""Load test delivery emails against a local SMTP sink (test sites only)"""
+	import frappe
+
+	from tcb_sales_invoice_email.load_test import run_delivery_email_load_test
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		run_delivery_email_load_test(
+			invoices=invoices, customers=customers, port=port, timeout=timeout, keep=keep
+		)
+	finally:
+		frappe.destroy()
+
+
+commands = [delivery_email_load_test]
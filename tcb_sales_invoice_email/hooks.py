@@ -156,10 +156,8 @@ scheduler_events = {
 	"cron": {
 		"0 0 * * *": [
 			# Runs at midnight (00:00)
-			"tcb_sales_invoice_email.tasks.send_delivery_emails"
-		],
-		"0 0 */4 * *": [
-			# Runs at midnight (00:00) every 4 days
+			"tcb_sales_invoice_email.tasks.send_delivery_emails",
+			# Runs daily, each night handles one cohort of customers
 			"tcb_sales_invoice_email.tasks.send_overdue_invoice_emails"
 		]
 	}
@@ -0,0 +1,332 @@
+import email
+import math
+import threading
+import time
+
+import frappe
+from frappe import _
+from frappe.utils import cint, today
+
+from tcb_sales_invoice_email.tasks import NOTIFICATION_BATCH_SIZE, process_notification_batch
+
+LOAD_TEST_PREFIX = "_Load Test"
+LOAD_TEST_EMAIL_ACCOUNT = "_Load Test Outgoing"
+
+
+class SMTPSinkHandler:
+	"""aiosmtpd handler that accepts every message and records when it arrived"""
+
+	def __init__(self):
+		self.accepted = []
+		self.lock = threading.Lock()
+
+	async def handle_DATA(self, server, session, envelope):
+		message = email.message_from_bytes(envelope.content)
+		with self.lock:
+			self.accepted.append((time.time(), message.get("Subject", "")))
+		return "250 Message accepted for delivery"
+
+
+def run_delivery_email_load_test(invoices=100, customers=10, port=8025, timeout=600, keep=False):
+	"""
+	Measure the throughput of the delivery email pipeline against a local SMTP sink.
+
+	Seeds `invoices` submitted Sales Invoices spread over `customers` customers, points
+	the default outgoing Email Account at an SMTP sink on localhost:`port`, runs the
+	notification pipeline over the seeded invoices only and flushes the email queue,
+	then reports messages per second, latency percentiles from job start to SMTP accept
+	and failure counts. The seeded documents are removed afterwards unless `keep` is set.
+
+	Only runs on sites with `allow_tests` set, since it creates documents and
+	replaces the default outgoing Email Account.
+	"""
+	try:
+		from aiosmtpd.controller import Controller
+	except ImportError:
+		frappe.throw(_("aiosmtpd is required for the load test, install it with: bench pip install aiosmtpd"))
+
+	if not frappe.conf.allow_tests:
+		frappe.throw(_("Load test can only be run on a site with allow_tests enabled"))
+
+	if frappe.are_emails_muted():
+		frappe.throw(_("Emails are muted on this site, unset mute_emails to run the load test"))
+
+	handler = SMTPSinkHandler()
+	controller = Controller(handler, hostname="127.0.0.1", port=cint(port))
+	controller.start()
+
+	# The load test account becomes the default outgoing account, remember the
+	# site's own default so it can be restored afterwards
+	previous_default = frappe.db.get_value(
+		"Email Account",
+		{"default_outgoing": 1, "name": ["!=", LOAD_TEST_EMAIL_ACCOUNT]},
+		"name",
+	)
+
+	invoice_names = []
+	try:
+		setup_load_test_email_account(port)
+		invoice_names = seed_load_test_invoices(cint(invoices), cint(customers))
+
+		# Run the pipeline batches over the seeded invoices only, in this process so
+		# the timing covers the real work and no other pending documents are emailed
+		job_start = time.time()
+		for idx in range(0, len(invoice_names), NOTIFICATION_BATCH_SIZE):
+			process_notification_batch("Sales Invoice", invoice_names[idx : idx + NOTIFICATION_BATCH_SIZE])
+		job_end = time.time()
+
+		if not frappe.db.count(
+			"Sales Invoice", {"name": ["in", invoice_names], "custom_mail_sent_to_customer": 1}
+		):
+			frappe.throw(_("No load test invoice was processed, check the error log for the cause"))
+
+		flush_email_queue(invoice_names, timeout)
+		flush_end = time.time()
+
+		return report_load_test(handler, invoice_names, job_start, job_end, flush_end)
+	finally:
+		controller.stop()
+		frappe.db.rollback()
+		frappe.db.set_value(
+			"Email Account",
+			LOAD_TEST_EMAIL_ACCOUNT,
+			{"enable_outgoing": 0, "default_outgoing": 0},
+		)
+		if previous_default:
+			frappe.db.set_value("Email Account", previous_default, "default_outgoing", 1)
+		frappe.db.commit()
+
+		if not keep:
+			cleanup_load_test_data(invoice_names, cint(customers))
+
+
+def setup_load_test_email_account(port):
+	"""Create or update the default outgoing Email Account pointing at the SMTP sink"""
+	if frappe.db.exists("Email Account", LOAD_TEST_EMAIL_ACCOUNT):
+		account = frappe.get_doc("Email Account", LOAD_TEST_EMAIL_ACCOUNT)
+	else:
+		account = frappe.new_doc("Email Account")
+		account.email_account_name = LOAD_TEST_EMAIL_ACCOUNT
+
+	account.update(
+		{
+			"email_id": "load-test@example.com",
+			"service": "",
+			"smtp_server": "127.0.0.1",
+			"smtp_port": cint(port),
+			"use_tls": 0,
+			"use_ssl_for_outgoing": 0,
+			"no_smtp_authentication": 1,
+			"enable_incoming": 0,
+			"enable_outgoing": 1,
+			"default_outgoing": 1,
+		}
+	)
+	account.save(ignore_permissions=True)
+	frappe.db.commit()
+
+
+def seed_load_test_invoices(invoices, customers):
+	"""
+	Create submitted Sales Invoices flagged for delivery emails, each with a
+	'to' recipient contact of its customer.
+
+	Returns:
+	    list: Names of the created Sales Invoices
+	"""
+	company = frappe.defaults.get_global_default("company") or frappe.get_all("Company", pluck="name")[0]
+	item_code = get_load_test_item()
+	customer_contacts = [get_load_test_customer(idx) for idx in range(customers)]
+
+	invoice_names = []
+	for idx in range(invoices):
+		customer, contact = customer_contacts[idx % customers]
+
+		invoice = frappe.get_doc(
+			{
+				"doctype": "Sales Invoice",
+				"customer": customer,
+				"company": company,
+				"posting_date": today(),
+				"due_date": today(),
+				"items": [{"item_code": item_code, "qty": 1, "rate": 100}],
+				"custom_send_delivery_mail": 1,
+				"custom_dispatch_email_to": [{"contact": contact, "send_as": "to"}],
+			}
+		)
+		invoice.insert(ignore_permissions=True)
+		invoice.submit()
+		invoice_names.append(invoice.name)
+
+		if (idx + 1) % 100 == 0:
+			frappe.db.commit()
+
+	frappe.db.commit()
+	return invoice_names
+
+
+def get_load_test_item():
+	"""Get or create the non-stock item used on load test invoices"""
+	item_code = f"{LOAD_TEST_PREFIX} Item"
+	if not frappe.db.exists("Item", item_code):
+		frappe.get_doc(
+			{
+				"doctype": "Item",
+				"item_code": item_code,
+				"item_group": frappe.get_all("Item Group", filters={"is_group": 0}, pluck="name")[0],
+				"stock_uom": "Nos",
+				"is_stock_item": 0,
+			}
+		).insert(ignore_permissions=True)
+
+	return item_code
+
+
+def get_load_test_customer(idx):
+	"""Get or create a load test customer and its contact, returns (customer, contact)"""
+	customer_name = f"{LOAD_TEST_PREFIX} Customer {idx}"
+	customer = frappe.db.get_value("Customer", {"customer_name": customer_name})
+	if not customer:
+		customer = (
+			frappe.get_doc({"doctype": "Customer", "customer_name": customer_name})
+			.insert(ignore_permissions=True)
+			.name
+		)
+
+	contact = frappe.db.get_value(
+		"Dynamic Link",
+		{"parenttype": "Contact", "link_doctype": "Customer", "link_name": customer},
+		"parent",
+	)
+	if not contact:
+		contact_doc = frappe.get_doc(
+			{
+				"doctype": "Contact",
+				"first_name": customer_name,
+				"email_ids": [{"email_id": f"load-test-{idx}@example.com", "is_primary": 1}],
+				"links": [{"link_doctype": "Customer", "link_name": customer}],
+			}
+		)
+		contact = contact_doc.insert(ignore_permissions=True).name
+
+	return customer, contact
+
+
+def flush_email_queue(invoice_names, timeout):
+	"""Flush the email queue until every load test email has left the queue or `timeout` seconds pass"""
+	from frappe.email.queue import flush
+
+	deadline = time.time() + cint(timeout)
+	while time.time() < deadline:
+		flush()
+		frappe.db.commit()
+
+		pending = frappe.db.count(
+			"Email Queue",
+			{
+				"reference_doctype": "Sales Invoice",
+				"reference_name": ["in", invoice_names],
+				"status": ["in", ["Not Sent", "Sending"]],
+			},
+		)
+		if not pending:
+			return
+
+		time.sleep(1)
+
+
+def report_load_test(handler, invoice_names, job_start, job_end, flush_end):
+	"""Build and print the load test report"""
+	invoice_set = set(invoice_names)
+	latencies = sorted(
+		accepted_at - job_start
+		for accepted_at, subject in list(handler.accepted)
+		if subject.rsplit(" - ", 1)[-1] in invoice_set
+	)
+
+	queue_errors = frappe.db.count(
+		"Email Queue",
+		{
+			"reference_doctype": "Sales Invoice",
+			"reference_name": ["in", invoice_names],
+			"status": ["in", ["Error", "Partially Errored"]],
+		},
+	)
+	not_marked_sent = frappe.db.count(
+		"Sales Invoice",
+		{"name": ["in", invoice_names], "custom_mail_sent_to_customer": 0},
+	)
+
+	duration = (latencies[-1] if latencies else flush_end - job_start) or 1
+	report = {
+		"invoices": len(invoice_names),
+		"accepted": len(latencies),
+		"missing": len(invoice_names) - len(latencies),
+		"queue_errors": queue_errors,
+		"not_marked_sent": not_marked_sent,
+		"task_seconds": job_end - job_start,
+		"total_seconds": flush_end - job_start,
+		"messages_per_second": len(latencies) / duration,
+		"latency_p50": get_percentile(latencies, 50),
+		"latency_p90": get_percentile(latencies, 90),
+		"latency_p99": get_percentile(latencies, 99),
+	}
+
+	print(f"Invoices seeded:        {report['invoices']}")
+	print(f"Messages accepted:      {report['accepted']}")
+	print(f"Messages missing:       {report['missing']}")
+	print(f"Email Queue errors:     {report['queue_errors']}")
+	print(f"Invoices not marked:    {report['not_marked_sent']}")
+	print(f"Scheduler task time:    {report['task_seconds']:.2f}s")
+	print(f"Total time:             {report['total_seconds']:.2f}s")
+	print(f"Throughput:             {report['messages_per_second']:.2f} messages/s")
+	print(
+		"Latency (job start to SMTP accept): "
+		f"p50 {report['latency_p50']:.2f}s, p90 {report['latency_p90']:.2f}s, p99 {report['latency_p99']:.2f}s"
+	)
+
+	return report
+
+
+def get_percentile(values, percentile):
+	"""Nearest-rank percentile of an already sorted list"""
+	if not values:
+		return 0.0
+
+	rank = max(math.ceil(percentile / 100 * len(values)) - 1, 0)
+	return values[min(rank, len(values) - 1)]
+
+
+def cleanup_load_test_data(invoice_names, customers):
+	"""Remove the seeded invoices with their queued emails, customers, contacts and item"""
+	for name in invoice_names:
+		invoice = frappe.get_doc("Sales Invoice", name)
+		if invoice.docstatus == 1:
+			invoice.cancel()
+		frappe.delete_doc("Sales Invoice", name, ignore_permissions=True, force=True)
+
+	if invoice_names:
+		for queue_name in frappe.get_all(
+			"Email Queue",
+			filters={"reference_doctype": "Sales Invoice", "reference_name": ["in", invoice_names]},
+			pluck="name",
+		):
+			frappe.delete_doc("Email Queue", queue_name, ignore_permissions=True, force=True)
+
+	for idx in range(customers):
+		customer = frappe.db.get_value("Customer", {"customer_name": f"{LOAD_TEST_PREFIX} Customer {idx}"})
+		if not customer:
+			continue
+
+		for contact in frappe.get_all(
+			"Dynamic Link",
+			filters={"parenttype": "Contact", "link_doctype": "Customer", "link_name": customer},
+			pluck="parent",
+		):
+			frappe.delete_doc("Contact", contact, ignore_permissions=True, force=True)
+		frappe.delete_doc("Customer", customer, ignore_permissions=True, force=True)
+
+	if frappe.db.exists("Item", f"{LOAD_TEST_PREFIX} Item"):
+		frappe.delete_doc("Item", f"{LOAD_TEST_PREFIX} Item", ignore_permissions=True, force=True)
+
+	frappe.db.commit()
@@ -0,0 +1,89 @@
+import functools
+
+import frappe
+
+# Seconds a scheduler run keeps its lease before another run may take over
+TASK_LOCK_TTL = 60 * 60
+
+# Seconds a document stays claimed by the run that is processing it
+CLAIM_TTL = 15 * 60
+
+# Deletes a key only if it still holds the given token, in a single Redis call
+RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+	return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def get_lock_key(*parts):
+	"""Get the site-scoped Redis key for a lock or claim"""
+	return frappe.cache().make_key(":".join(["tcb_sales_invoice_email", *parts]))
+
+
+def acquire_lease(key, ttl):
+	"""
+	Atomically take a lease on `key` for `ttl` seconds.
+
+	Returns:
+	    str: Token identifying the lease holder, or None if someone else holds it
+	"""
+	token = frappe.generate_hash(length=16)
+	if frappe.cache().set(key, token, nx=True, ex=ttl):
+		return token
+	return None
+
+
+def release_lease(key, token):
+	"""Release a lease on `key`, only if it is still held with `token`"""
+	frappe.cache().eval(RELEASE_LEASE_SCRIPT, 1, key, token)
+
+
+def acquire_task_lock(task_name, ttl=TASK_LOCK_TTL):
+	"""Take the run-level lock of a scheduled task, returns its token or None"""
+	return acquire_lease(get_lock_key("task", task_name), ttl)
+
+
+def release_task_lock(task_name, token):
+	"""Release the run-level lock of a scheduled task"""
+	release_lease(get_lock_key("task", task_name), token)
+
+
+def claim_document(doctype, name, ttl=CLAIM_TTL):
+	"""
+	Claim a document so that no concurrent run processes it at the same time.
+
+	Returns:
+	    str: Claim token, or None if the document is already claimed
+	"""
+	return acquire_lease(get_lock_key("claim", doctype, name), ttl)
+
+
+def release_document(doctype, name, token):
+	"""Release a claim taken with `claim_document`"""
+	release_lease(get_lock_key("claim", doctype, name), token)
+
+
+def with_task_lock(task_name, ttl=TASK_LOCK_TTL):
+	"""
+	Decorator for scheduled tasks that skips the run if another run of the same
+	task (cron or a manual execute) still holds its lock.
+	"""
+
+	def decorator(fn):
+		@functools.wraps(fn)
+		def wrapper(*args, **kwargs):
+			token = acquire_task_lock(task_name, ttl)
+			if not token:
+				frappe.logger().info(f"{task_name} is already running, skipping this run")
+				return
+
+			try:
+				return fn(*args, **kwargs)
+			finally:
+				release_task_lock(task_name, token)
+
+		return wrapper
+
+	return decorator
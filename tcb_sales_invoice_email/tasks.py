@@ -1,173 +1,483 @@
+import csv
+import hashlib
+import heapq
+import os
+import re
 from datetime import datetime
 
 import frappe
 from frappe import _
 from frappe.email.doctype.email_template.email_template import get_email_template
-from frappe.utils import add_days, date_diff, flt, get_url_to_form, getdate, today
-
-
-def send_delivery_emails():
-    """
-    Scheduled task to send delivery emails for sales invoices.
-    Runs at midnight to check for invoices that need delivery emails sent.
-    """
-    frappe.logger().info("Starting delivery email process for sales invoices")
-
-    # Find qualifying invoices
-    invoices = frappe.get_all(
-        "Sales Invoice",
+from frappe.utils import add_days, cint, date_diff, flt, get_url_to_form, getdate, today
+
+from tcb_sales_invoice_email.locks import claim_document, release_document, with_task_lock
+
+# Default number of days between two overdue reminders for the same customer,
+# used when the customer's group has no cadence configured
+DEFAULT_OVERDUE_REMINDER_CADENCE = 4
+
+# Customers with more overdue invoices than this get a truncated table in the
+# email body and the full list as a CSV attachment
+LARGE_STATEMENT_THRESHOLD = 200
+
+# Number of most overdue invoices shown inline for large statements
+LARGE_STATEMENT_INLINE_ROWS = 50
+
+# Number of documents handled per batch (and per background job) by the
+# notification pipeline
+NOTIFICATION_BATCH_SIZE = 50
+
+
+def get_sales_invoice_context(doc):
+    """Get the email template context for a Sales Invoice delivery notification"""
+    return {
+        "invoice_no": doc.name,
+        "invoice_date": doc.get("posting_date", ""),
+        "po_number": doc.get("po_no", "N/A"),
+        "po_date": doc.get("po_date", "N/A"),
+        "transporter": doc.get("transporter", ""),
+        "transport_receipt_no": doc.get("lr_no", ""),
+        "transport_receipt_date": doc.get("lr_date", ""),
+        "customer_name": doc.get("customer_name") or doc.customer,
+        "invoice_url": get_url_to_form("Sales Invoice", doc.name),
+    }
+
+
+def get_sales_order_context(doc):
+    """Get the email template context for a Sales Order confirmation"""
+    return {
+        "order_no": doc.name,
+        "order_date": doc.get("transaction_date", ""),
+        "delivery_date": doc.get("delivery_date", ""),
+        "po_number": doc.get("po_no", "N/A"),
+        "po_date": doc.get("po_date", "N/A"),
+        "customer_name": doc.get("customer_name") or doc.customer,
+        "order_url": get_url_to_form("Sales Order", doc.name),
+    }
+
+
+def get_delivery_note_context(doc):
+    """Get the email template context for a Delivery Note dispatch notification"""
+    return {
+        "delivery_note_no": doc.name,
+        "delivery_date": doc.get("posting_date", ""),
+        "po_number": doc.get("po_no", "N/A"),
+        "po_date": doc.get("po_date", "N/A"),
+        "transporter": doc.get("transporter_name", ""),
+        "transport_receipt_no": doc.get("lr_no", ""),
+        "transport_receipt_date": doc.get("lr_date", ""),
+        "customer_name": doc.get("customer_name") or doc.customer,
+        "delivery_note_url": get_url_to_form("Delivery Note", doc.name),
+    }
+
+
+def get_pick_list_context(doc):
+    """Get the email template context for a Pick List notification"""
+    return {
+        "pick_list_no": doc.name,
+        "customer_name": doc.get("customer_name") or doc.customer,
+        "pick_list_url": get_url_to_form("Pick List", doc.name),
+    }
+
+
+# Registry of document types handled by the notification pipeline.
+# Each config defines how documents are selected, which Email Template and
+# print format are used, how the template context is built and what the
+# default email says when the template is not found.
+NOTIFICATION_CONFIGS = {
+    "Sales Invoice": frappe._dict(
         filters={
             "docstatus": 1,  # Submitted invoices
             "custom_send_delivery_mail": 1,  # Send delivery mail flag is set
             "custom_mail_sent_to_customer": 0,  # Email not yet sent
         },
-        fields=["name", "customer", "customer_name"],
-    )
+        fields=["customer_name", "posting_date", "po_no", "po_date", "transporter", "lr_no", "lr_date"],
+        subject="Material Shipment Notification - {name}",
+        template="Sales Invoice Delivery Notification",
+        print_format="Standard",
+        get_context=get_sales_invoice_context,
+        document_no_key="invoice_no",
+        default_intro="We thought you would be happy to know that we have Shipped your material. The details are as follows:",
+        default_details=[
+            ("PO Number", "po_number"),
+            ("PO Date", "po_date"),
+            ("Invoice Date", "invoice_date"),
+            ("Transporter", "transporter"),
+            ("Transport Receipt No", "transport_receipt_no"),
+            ("Transport Receipt Date", "transport_receipt_date"),
+        ],
+    ),
+    "Sales Order": frappe._dict(
+        filters={"docstatus": 1, "custom_send_delivery_mail": 1, "custom_mail_sent_to_customer": 0},
+        fields=["customer_name", "transaction_date", "delivery_date", "po_no", "po_date"],
+        subject="Order Confirmation - {name}",
+        template="Sales Order Confirmation",
+        print_format="Standard",
+        get_context=get_sales_order_context,
+        document_no_key="order_no",
+        default_intro="We are pleased to confirm that we have received your order. The details are as follows:",
+        default_details=[
+            ("PO Number", "po_number"),
+            ("PO Date", "po_date"),
+            ("Order Date", "order_date"),
+            ("Expected Delivery Date", "delivery_date"),
+        ],
+    ),
+    "Delivery Note": frappe._dict(
+        filters={"docstatus": 1, "custom_send_delivery_mail": 1, "custom_mail_sent_to_customer": 0},
+        fields=["customer_name", "posting_date", "po_no", "po_date", "transporter_name", "lr_no", "lr_date"],
+        subject="Material Dispatch Notification - {name}",
+        template="Delivery Note Dispatch Notification",
+        print_format="Standard",
+        get_context=get_delivery_note_context,
+        document_no_key="delivery_note_no",
+        default_intro="We thought you would be happy to know that we have dispatched your material. The details are as follows:",
+        default_details=[
+            ("PO Number", "po_number"),
+            ("PO Date", "po_date"),
+            ("Delivery Date", "delivery_date"),
+            ("Transporter", "transporter"),
+            ("Transport Receipt No", "transport_receipt_no"),
+            ("Transport Receipt Date", "transport_receipt_date"),
+        ],
+    ),
+    "Pick List": frappe._dict(
+        filters={"docstatus": 1, "custom_send_delivery_mail": 1, "custom_mail_sent_to_customer": 0},
+        fields=["customer_name"],
+        subject="Material Ready for Dispatch - {name}",
+        template="Pick List Notification",
+        print_format="Standard",
+        get_context=get_pick_list_context,
+        document_no_key="pick_list_no",
+        default_intro="We thought you would be happy to know that your material has been picked and is ready for dispatch.",
+        default_details=[],
+    ),
+}
+
+
+@with_task_lock("send_delivery_emails")
+def send_delivery_emails(force_inline=False):
+    """
+    Scheduled task to send delivery emails for every document type in NOTIFICATION_CONFIGS.
+    Runs at midnight to check for documents that need delivery emails sent.
+    Overlapping runs are skipped, and each document is claimed before processing
+    so concurrent runs never send the same document twice.
 
-    frappe.logger().info(
-        f"Found {len(invoices)} invoices for delivery email processing"
-    )
+    The run-level lock only covers selection and enqueueing when batches go to background
+    jobs: it is released once the jobs are enqueued, not when they finish. Those jobs are
+    kept apart from later runs by their deterministic job IDs, the per-document claims
+    and the sent flag check before each email is queued.
 
-    # Process each invoice
-    for invoice in invoices:
+    Args:
+        force_inline: Process every batch in this process instead of background jobs
+    """
+    for doctype in NOTIFICATION_CONFIGS:
         try:
-            process_invoice_email(invoice.name)
+            run_notification_pipeline(doctype, force_inline=force_inline)
         except Exception as e:
-            frappe.logger().error(f"Error processing invoice {invoice.name}: {e!s}")
+            frappe.logger().error(f"Error running delivery email pipeline for {doctype}: {e!s}")
             continue
 
 
-def process_invoice_email(invoice_name):
+def run_notification_pipeline(doctype, force_inline=False):
     """
-    Process email sending for a single invoice.
+    Select the documents of `doctype` that need a delivery email and process them in batches.
+    A single batch (or every batch with `force_inline`) is processed inline, larger runs are
+    spread over background jobs. Job IDs are derived from the batch contents, so a run that
+    starts while an earlier run's jobs are still queued does not enqueue them again.
+    """
+    frappe.logger().info(f"Starting delivery email process for {doctype}")
+
+    names = select_notification_documents(doctype)
+
+    frappe.logger().info(f"Found {len(names)} {doctype} documents for delivery email processing")
+
+    batches = [
+        names[idx : idx + NOTIFICATION_BATCH_SIZE]
+        for idx in range(0, len(names), NOTIFICATION_BATCH_SIZE)
+    ]
+
+    if force_inline or len(batches) == 1:
+        for batch in batches:
+            process_notification_batch(doctype, batch)
+        return
+
+    for batch in batches:
+        batch_hash = hashlib.md5("\n".join(batch).encode("utf-8")).hexdigest()
+        frappe.enqueue(
+            "tcb_sales_invoice_email.tasks.process_notification_batch",
+            queue="long",
+            job_id=f"tcb_sales_invoice_email:{doctype}:{batch_hash}",
+            deduplicate=True,
+            doctype=doctype,
+            names=batch,
+        )
+
+
+def select_notification_documents(doctype):
+    """Get the names of documents matching the selection filters of the doctype's config"""
+    config = NOTIFICATION_CONFIGS[doctype]
+    return frappe.get_all(doctype, filters=config.filters, pluck="name", order_by="creation asc")
+
+
+def process_notification_batch(doctype, names):
+    """
+    Run the batched stages of the delivery email pipeline for a batch of documents:
+    claim, read, resolve recipients, render with attachments, then queue and write back.
 
     Args:
-        invoice_name: The name/ID of the Sales Invoice
+        doctype: Document type registered in NOTIFICATION_CONFIGS
+        names: Names of the documents in the batch
     """
-    doc = frappe.get_doc("Sales Invoice", invoice_name)
+    claims = {}
+    for name in names:
+        claim = claim_document(doctype, name)
+        if claim:
+            claims[name] = claim
+        else:
+            frappe.logger().info(f"{doctype} {name} is being processed by another run, skipping")
 
-    # Skip if no email recipients defined
-    if (
-        not doc.get("custom_dispatch_email_to")
-        or len(doc.custom_dispatch_email_to) == 0
-    ):
-        frappe.logger().info(
-            f"No email recipients defined for {invoice_name}, skipping"
-        )
-        return
+    try:
+        docs = get_notification_documents(doctype, list(claims))
+        recipients = get_notification_recipients(doctype, [doc.name for doc in docs])
+        notifications = render_notification_batch(doctype, docs, recipients)
+        queue_notification_batch(doctype, notifications)
+    finally:
+        for name, claim in claims.items():
+            release_document(doctype, name, claim)
 
-    # Get email recipients by type (TO, CC, BCC)
-    recipients = {"to": [], "cc": [], "bcc": []}
 
-    for recipient in doc.custom_dispatch_email_to:
-        if recipient.contact and recipient.send_as:
-            # Get contact's email directly from email_id field
-            contact_data = frappe.db.get_value(
-                "Contact", recipient.contact, "email_id", as_dict=1
-            )
+def get_notification_documents(doctype, names):
+    """
+    Fetch the fields needed to render emails for claimed documents in one query.
+    Documents already sent by another run since selection are left out, the sent flag
+    is checked again with a locking read right before each document is sent.
+    """
+    if not names:
+        return []
 
-            if contact_data and contact_data.email_id:
-                send_as = recipient.send_as.lower()
-                if send_as in recipients:
-                    recipients[send_as].append(contact_data.email_id)
+    config = NOTIFICATION_CONFIGS[doctype]
+    meta = frappe.get_meta(doctype)
+    fields = ["name", "customer"] + [field for field in config.fields if meta.has_field(field)]
 
-    # Check if we have any recipients
-    if not recipients["to"]:
-        frappe.logger().warning(
-            f"No 'TO' recipients found for {invoice_name}, skipping"
+    return frappe.get_all(
+        doctype,
+        filters={"name": ["in", names], **config.filters},
+        fields=fields,
+    )
+
+
+def get_notification_recipients(
+    doctype,
+    names,
+    child_doctype="Delivery Mail Detail",
+    parentfield="custom_dispatch_email_to",
+):
+    """
+    Resolve the email recipients of a batch of documents with one query
+    for the recipient rows and one for the contact email addresses.
+
+    Args:
+        doctype: Parent document type
+        names: Names of the parent documents
+        child_doctype: Recipient table doctype, dispatch recipients by default
+        parentfield: Recipient table field on the parent doctype
+
+    Returns:
+        dict: Document name to recipients grouped by type (to, cc, bcc)
+    """
+    if not names:
+        return {}
+
+    rows = frappe.get_all(
+        child_doctype,
+        filters={
+            "parenttype": doctype,
+            "parentfield": parentfield,
+            "parent": ["in", names],
+        },
+        fields=["parent", "contact", "send_as"],
+        order_by="idx asc",
+    )
+
+    # Get contacts' emails directly from email_id field
+    contacts = list({row.contact for row in rows if row.contact})
+    emails = {}
+    if contacts:
+        emails = dict(
+            frappe.get_all(
+                "Contact",
+                filters={"name": ["in", contacts]},
+                fields=["name", "email_id"],
+                as_list=True,
+            )
         )
-        return
 
-    try:
-        # Prepare email content
-        subject = f"Material Shipment Notification - {doc.name}"
-
-        # Get invoice details for email
-        invoice_url = get_url_to_form("Sales Invoice", doc.name)
-        invoice_data = {
-            "invoice_no": doc.name,
-            "invoice_date": doc.get("posting_date", ""),
-            "po_number": doc.get("po_no", "N/A"),
-            "po_date": doc.get("po_date", "N/A"),
-            "transporter": doc.get("transporter", ""),
-            "transport_receipt_no": doc.get("lr_no", ""),
-            "transport_receipt_date": doc.get("lr_date", ""),
-            "customer_name": doc.customer_name,
-            "invoice_url": invoice_url,
-        }
+    recipients = {}
+    for row in rows:
+        email_id = emails.get(row.contact)
+        if not email_id or not row.send_as:
+            continue
 
-        # Try to get email template
-        template_name = "Sales Invoice Delivery Notification"
-        template_args = invoice_data
+        send_as = row.send_as.lower()
+        doc_recipients = recipients.setdefault(row.parent, {"to": [], "cc": [], "bcc": []})
+        if send_as in doc_recipients:
+            doc_recipients[send_as].append(email_id)
+
+    return recipients
+
+
+def get_notification_template(doctype):
+    """Get the Email Template configured for the doctype, or None if it does not exist"""
+    template_name = NOTIFICATION_CONFIGS[doctype].template
+    if not frappe.db.exists("Email Template", template_name):
+        return None
+
+    return frappe.get_cached_doc("Email Template", template_name)
+
+
+def render_notification_batch(doctype, docs, recipients):
+    """
+    Render the message and PDF attachment of every document in a batch.
+    At most NOTIFICATION_BATCH_SIZE attachments are held in memory at a time.
+    Documents without a 'TO' recipient or that fail to render are logged and left out.
+
+    Returns:
+        list: Dicts with the document name, recipients, subject, message and attachment
+    """
+    config = NOTIFICATION_CONFIGS[doctype]
+    template = get_notification_template(doctype)
+
+    notifications = []
+    for doc in docs:
+        doc_recipients = recipients.get(doc.name)
+
+        # Check if we have any recipients
+        if not doc_recipients or not doc_recipients["to"]:
+            frappe.logger().warning(f"No 'TO' recipients found for {doctype} {doc.name}, skipping")
+            continue
 
         try:
-            email_content = get_email_template(template_name, template_args)
-            message = email_content.message
-        except Exception:
-            # Fallback to default email content if template not found
-            message = get_default_email_content(invoice_data)
+            context = config.get_context(doc)
+            notifications.append(
+                {
+                    "name": doc.name,
+                    "recipients": doc_recipients,
+                    "subject": config.subject.format(name=doc.name),
+                    "message": render_notification_message(doctype, doc.name, template, context),
+                    "attachment": get_document_attachment(doctype, doc.name, config.print_format),
+                }
+            )
+        except Exception as e:
+            frappe.logger().error(f"Failed to render delivery email for {doctype} {doc.name}: {e!s}")
+            continue
 
-        # Send email
-        frappe.sendmail(
-            recipients=recipients["to"],
-            cc=recipients["cc"] if recipients["cc"] else None,
-            bcc=recipients["bcc"] if recipients["bcc"] else None,
-            subject=subject,
-            message=message,
-            attachments=[get_invoice_attachment(doc)],
-            reference_doctype="Sales Invoice",
-            reference_name=doc.name,
-        )
+    return notifications
 
-        # Update invoice status using db.set_value since document is submitted
-        frappe.db.set_value(
-            "Sales Invoice",
-            doc.name,
-            "custom_mail_sent_to_customer",
-            1,
-            update_modified=False,
-        )
 
-        frappe.db.commit()
-        frappe.logger().info(f"Delivery email sent successfully for {invoice_name}")
+def render_notification_message(doctype, name, template, context):
+    """Render the Email Template for a document, falling back to the default content"""
+    message = None
+    if template:
+        try:
+            message = frappe.render_template(
+                template.response_html if template.use_html else template.response, context
+            )
+        except Exception as e:
+            frappe.logger().error(f"Failed to render {template.name} for {doctype} {name}: {e!s}")
 
-    except Exception as e:
-        frappe.db.rollback()
-        frappe.logger().error(
-            f"Failed to send delivery email for {invoice_name}: {e!s}"
-        )
-        raise
+    if not message:
+        # Fallback to default email content if template not found
+        message = get_default_notification_content(context, doctype)
 
+    return message
 
-def get_invoice_attachment(doc):
-    """Get the sales invoice as an attachment"""
-    invoice_print = frappe.attach_print(
-        "Sales Invoice",
-        doc.name,
-        file_name=f"{doc.name}.pdf",
-        print_format="Standard",  # Use your preferred print format
+
+def queue_notification_batch(doctype, notifications):
+    """
+    Queue the rendered emails of a batch and mark their documents as sent.
+    Each document is committed on its own, so a failure does not affect the rest of the batch.
+    """
+    for notification in notifications:
+        name = notification["name"]
+        recipients = notification["recipients"]
+
+        try:
+            # Skip if another run sent the email since this batch was read. The locking read
+            # sees commits made after this run's selection and is held only until the commit below
+            if frappe.db.get_value(doctype, name, "custom_mail_sent_to_customer", for_update=True):
+                frappe.logger().info(f"Delivery email already sent for {doctype} {name}, skipping")
+                frappe.db.rollback()
+                continue
+
+            frappe.sendmail(
+                recipients=recipients["to"],
+                cc=recipients["cc"] if recipients["cc"] else None,
+                bcc=recipients["bcc"] if recipients["bcc"] else None,
+                subject=notification["subject"],
+                message=notification["message"],
+                attachments=[notification["attachment"]],
+                reference_doctype=doctype,
+                reference_name=name,
+            )
+
+            # Update status using db.set_value since document is submitted
+            frappe.db.set_value(
+                doctype,
+                name,
+                "custom_mail_sent_to_customer",
+                1,
+                update_modified=False,
+            )
+
+            frappe.db.commit()
+            frappe.logger().info(f"Delivery email queued successfully for {doctype} {name}")
+
+        except Exception as e:
+            frappe.db.rollback()
+            frappe.logger().error(f"Failed to send delivery email for {doctype} {name}: {e!s}")
+            continue
+
+
+def get_document_attachment(doctype, name, print_format="Standard"):
+    """Get the document as a PDF attachment"""
+    return frappe.attach_print(
+        doctype,
+        name,
+        file_name=f"{name}.pdf",
+        print_format=print_format,
     )
-    return invoice_print
 
 
-def get_default_email_content(invoice_data):
-    """Generate default email content if template is not found"""
+def get_default_notification_content(context, doctype):
+    """
+    Generate default email content for a delivery notification if its template is not found.
+
+    Args:
+        context: Template context of the document
+        doctype: Document type registered in NOTIFICATION_CONFIGS
+    """
+    config = NOTIFICATION_CONFIGS[doctype]
+
+    details_html = ""
+    if config.default_details:
+        details_html = "<p>" + "<br>\n    ".join(
+            f"{label}: {context.get(key) or ''}" for label, key in config.default_details
+        ) + "</p>"
+
+    document_label = f"{doctype} {context.get(config.document_no_key, '')}"
+
     return f"""
-    <p>Dear {invoice_data.get('customer_name', '')},</p>
+    <p>Dear {context.get('customer_name', '')},</p>
 
     <p>Greetings of the day,</p>
-    <p>We thought you would be happy to know that we have Shipped your material. The details are as follows:</p>
+    <p>{config.default_intro}</p>
 
-    <p>PO Number: {invoice_data.get('po_number', 'N/A')}<br>
-    PO Date: {invoice_data.get('po_date', 'N/A')}<br>
-    Invoice Date: {invoice_data.get('invoice_date', '')}<br>
-    Transporter: {invoice_data.get('transporter', '')}<br>
-    Transport Receipt No: {invoice_data.get('transport_receipt_no', '')}<br>
-    Transport Receipt Date: {invoice_data.get('transport_receipt_date', '')}</p>
+    {details_html}
 
-    <p>Please find attached your Sales Invoice {invoice_data.get('invoice_no', '')}.</p>
+    <p>Please find attached your {document_label}.</p>
 
-    <p>Thank you for giving us an opportunity to serve you.Kindly Note that this is an auto-generated email.</p>
+    <p>Thank you for giving us an opportunity to serve you. Kindly note that this is an auto-generated email.</p>
     <p>If you have any concerns you can reply to this email and we will promptly look into it.
     Alternatively, you can reach out to us at +91 0000000000</p>
 
@@ -177,25 +487,96 @@ def get_default_email_content(invoice_data):
     """
 
 
+@with_task_lock("send_overdue_invoice_emails")
 def send_overdue_invoice_emails():
     """
     Scheduled task to send overdue invoice reminder emails.
-    Runs every 4 days to check for invoices that are overdue and need reminder emails sent.
+    Runs daily, but each customer is only processed on the days of its reminder cohort
+    (see `is_customer_due_for_reminder`), so the load is spread evenly across the cadence.
     """
     frappe.logger().info("Starting overdue invoice email process")
 
-    # Find qualifying invoices that are overdue
+    # Only customers whose reminder cohort falls on today are processed, using the
+    # cadence of the customer's current group so all their invoices are reminded together
+    due_customers = get_customers_due_for_reminder(getdate(today()).toordinal())
+
+    frappe.logger().info(
+        f"{len(due_customers)} customers are due for an overdue reminder today"
+    )
+
+    if not due_customers:
+        return
+
+    # Find customers of today's cohort that have overdue invoices, their invoices
+    # are loaded one customer at a time so memory does not grow with the total
+    customers = frappe.get_all(
+        "Sales Invoice",
+        filters=get_overdue_invoice_filters(list(due_customers)),
+        fields=["customer"],
+        distinct=True,
+        pluck="customer",
+    )
+
+    frappe.logger().info(f"Found {len(customers)} customers with overdue invoices for email processing")
+
+    # Process each customer's invoices
+    for customer in customers:
+        claim = claim_document("Customer", customer)
+        if not claim:
+            frappe.logger().info(
+                f"Overdue invoices for customer {customer} are being processed by another run, skipping"
+            )
+            continue
+
+        try:
+            # Skip if another run already reminded the customer today, read with a
+            # locking read so commits made after this run's selection are seen
+            last_reminder_date = frappe.db.get_value(
+                "Customer", customer, "custom_last_overdue_reminder_date", for_update=True
+            )
+            if last_reminder_date and getdate(last_reminder_date) == getdate(today()):
+                frappe.logger().info(
+                    f"Overdue reminder already sent today for customer {customer}, skipping"
+                )
+                continue
+
+            data = get_customer_overdue_invoices(customer)
+            data["cadence"] = due_customers[customer]
+            process_overdue_invoice_email(customer, data)
+        except Exception as e:
+            frappe.logger().error(
+                f"Error processing overdue invoices for customer {customer}: {e!s}"
+            )
+            continue
+        finally:
+            # Release the Customer row lock on every path that did not commit
+            frappe.db.rollback()
+            release_document("Customer", customer, claim)
+
+
+def get_overdue_invoice_filters(customers):
+    """Get the filters selecting overdue invoices of the given customers"""
+    return {
+        "docstatus": 1,  # Submitted invoices
+        "custom_send_due_invoice_email": 1,  # Send overdue invoice email flag is set
+        "outstanding_amount": [">", 0],  # Has outstanding amount
+        "due_date": ["<", today()],  # Due date has passed
+        "customer": ["in", customers],
+    }
+
+
+def get_customer_overdue_invoices(customer):
+    """
+    Get a customer's overdue invoices.
+
+    Returns:
+        dict: Customer name and list of overdue invoices
+    """
     invoices = frappe.get_all(
         "Sales Invoice",
-        filters={
-            "docstatus": 1,  # Submitted invoices
-            "custom_send_due_invoice_email": 1,  # Send overdue invoice email flag is set
-            "outstanding_amount": [">", 0],  # Has outstanding amount
-            "due_date": ["<", today()],  # Due date has passed
-        },
+        filters=get_overdue_invoice_filters([customer]),
         fields=[
             "name",
-            "customer",
             "customer_name",
             "po_no",
             "posting_date",
@@ -206,22 +587,9 @@ def send_overdue_invoice_emails():
         ],
     )
 
-    frappe.logger().info(f"Found {len(invoices)} overdue invoices for email processing")
-
-    # Group invoices by customer
-    customer_invoices = {}
-    for invoice in invoices:
-        if invoice.customer not in customer_invoices:
-            customer_invoices[invoice.customer] = {
-                "name": invoice.customer_name,
-                "invoices": [],
-            }
-
-        # Calculate days overdue
-        days_overdue = date_diff(today(), getdate(invoice.due_date))
-
-        # Add invoice to customer's list
-        customer_invoices[invoice.customer]["invoices"].append(
+    return {
+        "name": invoices[0].customer_name if invoices else customer,
+        "invoices": [
             {
                 "name": invoice.name,
                 "po_no": invoice.po_no or "",
@@ -230,19 +598,73 @@ def send_overdue_invoice_emails():
                 "rounded_total": invoice.rounded_total,
                 "grand_total": invoice.grand_total,
                 "outstanding_amount": invoice.outstanding_amount,
-                "days_overdue": days_overdue,
+                # Calculate days overdue
+                "days_overdue": date_diff(today(), getdate(invoice.due_date)),
             }
-        )
+            for invoice in invoices
+        ],
+    }
 
-    # Process each customer's invoices
-    for customer, data in customer_invoices.items():
-        try:
-            process_overdue_invoice_email(customer, data)
-        except Exception as e:
-            frappe.logger().error(
-                f"Error processing overdue invoices for customer {customer}: {e!s}"
-            )
-            continue
+
+def get_customer_group_cadences():
+    """
+    Get the overdue reminder cadence (in days) configured on each Customer Group.
+    Groups without a cadence fall back to DEFAULT_OVERDUE_REMINDER_CADENCE.
+    """
+    customer_groups = frappe.get_all(
+        "Customer Group",
+        fields=["name", "custom_overdue_reminder_cadence"],
+    )
+
+    return {
+        group.name: cint(group.custom_overdue_reminder_cadence)
+        or DEFAULT_OVERDUE_REMINDER_CADENCE
+        for group in customer_groups
+    }
+
+
+def get_customers_due_for_reminder(day_number):
+    """
+    Get the customers whose reminder cohort falls on the given day.
+
+    Args:
+        day_number: Ordinal of the day being processed
+
+    Returns:
+        dict: Customer ID to its reminder cadence (in days), taken from its current Customer Group
+    """
+    group_cadences = get_customer_group_cadences()
+    customers = frappe.get_all("Customer", fields=["name", "customer_group"], as_list=True)
+
+    due_customers = {}
+    for customer, customer_group in customers:
+        cadence = group_cadences.get(customer_group, DEFAULT_OVERDUE_REMINDER_CADENCE)
+        if is_customer_due_for_reminder(customer, cadence, day_number):
+            due_customers[customer] = cadence
+
+    return due_customers
+
+
+def get_reminder_cohort(customer_id, cadence):
+    """
+    Get the stable cohort (0 to cadence - 1) a customer belongs to.
+    A hash of the customer ID is used so the cohort does not change between runs.
+    """
+    digest = hashlib.md5(customer_id.encode("utf-8")).hexdigest()
+    return int(digest, 16) % cadence
+
+
+def is_customer_due_for_reminder(customer_id, cadence, day_number):
+    """
+    Check whether a customer should receive an overdue reminder on the given day.
+
+    Args:
+        customer_id: The customer ID
+        cadence: Number of days between two reminders for this customer
+        day_number: Ordinal of the day being processed (continuous across month ends)
+    """
+    cadence = max(cint(cadence), 1)
+    return get_reminder_cohort(customer_id, cadence) == day_number % cadence
 
 
 def process_overdue_invoice_email(customer_id, customer_data):
@@ -253,38 +675,22 @@ def process_overdue_invoice_email(customer_id, customer_data):
         customer_id: The customer ID
         customer_data: Dict containing customer name and list of overdue invoices
     """
-    # Fetch the first invoice to get email recipients
-    first_invoice_name = customer_data["invoices"][0]["name"]
-
-    # Try to get email recipients from the custom overdue_invoice_email_to child table
-    recipients = {"to": [], "cc": [], "bcc": []}
-    email_recipients = frappe.get_all(
-        "Overdue Invoice Mail To",
-        filters={"parent": first_invoice_name},
-        fields=["contact", "send_as"],
-    )
-
-    # If no recipients are defined, log and skip
-    if not email_recipients or len(email_recipients) == 0:
-        frappe.logger().info(
-            f"No email recipients defined for customer {customer_id}, skipping"
-        )
+    if not customer_data["invoices"]:
         return
 
-    # Collect email addresses from contacts
-    for recipient in email_recipients:
-        if recipient.contact and recipient.send_as:
-            contact_data = frappe.db.get_value(
-                "Contact", recipient.contact, "email_id", as_dict=1
-            )
+    # Fetch the first invoice to get email recipients
+    first_invoice_name = customer_data["invoices"][0]["name"]
 
-            if contact_data and contact_data.email_id:
-                send_as = recipient.send_as.lower()
-                if send_as in recipients:
-                    recipients[send_as].append(contact_data.email_id)
+    # Get email recipients from the custom overdue_invoice_email_to child table
+    recipients = get_notification_recipients(
+        "Sales Invoice",
+        [first_invoice_name],
+        child_doctype="Overdue Mail Detail",
+        parentfield="custom_overdue_invoice_email_to",
+    ).get(first_invoice_name)
 
     # Check if we have any recipients
-    if not recipients["to"]:
+    if not recipients or not recipients["to"]:
         frappe.logger().warning(
             f"No 'TO' recipients found for customer {customer_id}, skipping"
         )
@@ -294,17 +700,37 @@ def process_overdue_invoice_email(customer_id, customer_data):
         # Prepare email content
         subject = f"Outstanding Invoice Reminder - {customer_data['name']}"
 
+        invoices = customer_data["invoices"]
+        is_large_statement = len(invoices) > LARGE_STATEMENT_THRESHOLD
+        total_outstanding = sum(flt(inv["outstanding_amount"]) for inv in invoices)
+        attachments = []
+
+        # Large statements only show the most overdue invoices inline,
+        # the full list is sent as an attachment
+        if is_large_statement:
+            inline_invoices = get_most_overdue_invoices(invoices)
+            attachments.append(
+                get_overdue_invoice_attachment(customer_id, invoices)
+            )
+        else:
+            inline_invoices = invoices
+
         # Generate HTML table for invoices
-        invoice_table = get_overdue_invoice_table(customer_data["invoices"])
+        invoice_table = get_overdue_invoice_table(
+            inline_invoices,
+            total_outstanding=total_outstanding,
+            total_invoices=len(invoices),
+        )
 
         # Try to get email template
         template_name = "Overdue Invoice Reminder"
         template_args = {
             "customer_name": customer_data["name"],
             "invoice_table": invoice_table,
-            "total_outstanding": sum(
-                inv["outstanding_amount"] for inv in customer_data["invoices"]
-            ),
+            "total_outstanding": total_outstanding,
+            "total_invoices": len(invoices),
+            "is_large_statement": is_large_statement,
+            "cadence": customer_data.get("cadence", DEFAULT_OVERDUE_REMINDER_CADENCE),
         }
 
         try:
@@ -313,7 +739,10 @@ def process_overdue_invoice_email(customer_id, customer_data):
         except Exception:
             # Fallback to default overdue invoice email content
             message = get_default_overdue_email_content(
-                customer_data["name"], invoice_table
+                customer_data["name"],
+                invoice_table,
+                is_large_statement,
+                customer_data.get("cadence", DEFAULT_OVERDUE_REMINDER_CADENCE),
             )
 
         # Send email
@@ -323,6 +752,7 @@ def process_overdue_invoice_email(customer_id, customer_data):
             bcc=recipients["bcc"] if recipients["bcc"] else None,
             subject=subject,
             message=message,
+            attachments=attachments or None,
             reference_doctype="Sales Invoice",
             reference_name=first_invoice_name,
         )
@@ -337,6 +767,15 @@ def process_overdue_invoice_email(customer_id, customer_data):
                 update_modified=False,
             )
 
+        # Record the reminder so later runs on the same day skip this customer
+        frappe.db.set_value(
+            "Customer",
+            customer_id,
+            "custom_last_overdue_reminder_date",
+            today(),
+            update_modified=False,
+        )
+
         frappe.db.commit()
         frappe.logger().info(
             f"Overdue invoice email sent successfully for {customer_id}"
@@ -344,16 +783,23 @@ def process_overdue_invoice_email(customer_id, customer_data):
 
     except Exception as e:
         frappe.db.rollback()
+        if is_large_statement:
+            remove_orphaned_statement_file(customer_id)
         frappe.logger().error(
             f"Failed to send overdue invoice email for {customer_id}: {e!s}"
         )
         raise
 
 
-def get_overdue_invoice_table(invoices):
+def get_overdue_invoice_table(invoices, total_outstanding=None, total_invoices=None):
     """
     Generate HTML table for overdue invoices.
     Highlight invoices overdue by more than 20 days.
+
+    Args:
+        invoices: List of overdue invoices to show as rows
+        total_outstanding: Outstanding amount of the full statement, defaults to the sum of the rows
+        total_invoices: Invoice count of the full statement, used to note truncated tables
     """
     table_header = """
     <table border="1" cellspacing="0" cellpadding="5" style="border-collapse: collapse; width: 100%;">
@@ -369,8 +815,8 @@ def get_overdue_invoice_table(invoices):
         </tr>
     """
 
-    table_rows = ""
-    total_outstanding = 0
+    table_rows = []
+    rows_outstanding = 0
 
     for idx, invoice in enumerate(invoices, 1):
         # Highlight rows that are overdue by more than 20 days
@@ -378,7 +824,7 @@ def get_overdue_invoice_table(invoices):
             "" if invoice["days_overdue"] <= 20 else "background-color: #ffcccc;"
         )
 
-        table_rows += f"""
+        table_rows.append(f"""
         <tr style="{row_style}">
             <td align="center">{idx}</td>
             <td>{invoice['name']}</td>
@@ -389,9 +835,21 @@ def get_overdue_invoice_table(invoices):
             <td align="right">{frappe.format(invoice['outstanding_amount'], {'fieldtype': 'Currency'})}</td>
             <td align="center">{invoice['days_overdue']} days</td>
         </tr>
-        """
+        """)
+
+        rows_outstanding += flt(invoice["outstanding_amount"])
 
-        total_outstanding += flt(invoice["outstanding_amount"])
+    if total_outstanding is None:
+        total_outstanding = rows_outstanding
+
+    # Note how many invoices were left out of a truncated table
+    truncated_row = ""
+    if total_invoices and total_invoices > len(invoices):
+        truncated_row = f"""
+        <tr>
+            <td colspan="8" align="center"><i>Showing the {len(invoices)} most overdue of {total_invoices} invoices. The complete list is attached.</i></td>
+        </tr>
+        """
 
     # Add total row
     table_footer = f"""
@@ -403,23 +861,131 @@ def get_overdue_invoice_table(invoices):
     </table>
     """
 
-    return table_header + table_rows + table_footer
+    return table_header + "".join(table_rows) + truncated_row + table_footer
+
+
+def get_most_overdue_invoices(invoices, limit=LARGE_STATEMENT_INLINE_ROWS):
+    """Get the `limit` most overdue invoices shown inline for large statements"""
+    return heapq.nlargest(limit, invoices, key=lambda inv: inv["days_overdue"])
+
+
+def get_statement_file_name(customer_id):
+    """Get the file name of a customer's overdue statement CSV"""
+    return "Outstanding Invoices - {}.csv".format(re.sub(r"[^\w.-]+", "_", customer_id))
+
+
+def get_overdue_invoice_attachment(customer_id, invoices):
+    """
+    Get the full list of overdue invoices as a CSV attachment.
+    Rows are written one at a time to a private File on disk and the email references it
+    by file ID, so the CSV is not built as a string or stored in the Email Queue. Each
+    customer has a single statement File that is overwritten by every reminder, so old
+    statements do not pile up.
+    """
+    file_name = get_statement_file_name(customer_id)
+    file_url = f"/private/files/{file_name}"
+    file_path = frappe.get_site_path("private", "files", file_name)
+
+    with open(file_path, "w", encoding="utf-8", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(
+            [
+                "Invoice Number",
+                "Invoice Date",
+                "PO Number",
+                "Due Date",
+                "Invoiced Amount",
+                "Outstanding Amount",
+                "Overdue By (Days)",
+            ]
+        )
+        writer.writerows(
+            (
+                escape_csv_value(invoice["name"]),
+                invoice["posting_date"],
+                escape_csv_value(invoice["po_no"]),
+                invoice["due_date"],
+                flt(invoice["grand_total"]),
+                flt(invoice["outstanding_amount"]),
+                invoice["days_overdue"],
+            )
+            for invoice in invoices
+        )
+
+    file_size = os.path.getsize(file_path)
+    file_id = frappe.db.get_value(
+        "File",
+        {"file_url": file_url, "attached_to_doctype": "Customer", "attached_to_name": customer_id},
+    )
+
+    if file_id:
+        frappe.db.set_value("File", file_id, "file_size", file_size, update_modified=False)
+    else:
+        # Inserting hashes the file once, later reminders only update the size
+        file_id = (
+            frappe.get_doc(
+                {
+                    "doctype": "File",
+                    "file_name": file_name,
+                    "file_url": file_url,
+                    "file_size": file_size,
+                    "is_private": 1,
+                    "attached_to_doctype": "Customer",
+                    "attached_to_name": customer_id,
+                }
+            )
+            .insert(ignore_permissions=True)
+            .name
+        )
 
+    return {"fid": file_id}
 
-def get_default_overdue_email_content(customer_name, invoice_table):
+
+def remove_orphaned_statement_file(customer_id):
+    """Delete a customer's statement CSV from disk if its File record was rolled back"""
+    file_name = get_statement_file_name(customer_id)
+    if frappe.db.exists("File", {"file_url": f"/private/files/{file_name}"}):
+        return
+
+    file_path = frappe.get_site_path("private", "files", file_name)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+def escape_csv_value(value):
+    """Prefix values that spreadsheet applications would evaluate as formulas"""
+    value = value or ""
+    if value.startswith(("=", "+", "-", "@", "\t", "\r")):
+        return f"'{value}"
+    return value
+
+
+def get_default_overdue_email_content(
+    customer_name,
+    invoice_table,
+    is_large_statement=False,
+    cadence=DEFAULT_OVERDUE_REMINDER_CADENCE,
+):
     """Generate default email content for overdue invoice reminder"""
+    intro = "The following invoices are currently outstanding as per our records:"
+    if is_large_statement:
+        intro = (
+            "The most overdue of your outstanding invoices as per our records are listed below. "
+            "The complete statement is attached to this email:"
+        )
+
     return f"""
     <p>Dear {customer_name},</p>
 
     <p>Greetings of the day</p>
 
-    <p>The following invoices are currently outstanding as per our records:</p>
+    <p>{intro}</p>
 
     {invoice_table}
 
     <p>Please review them at your convenience and arrange for payment at the earliest.</p>
 
-    <p>Please note that this is an automated, system-generated payment reminder sent at regular intervals of every 3 days. However, if you have already made the payment or have any queries, feel free to reply to this email—our team will promptly look into it.</p>
+    <p>Please note that this is an automated, system-generated payment reminder sent at regular intervals of every {cadence} days. However, if you have already made the payment or have any queries, feel free to reply to this email—our team will promptly look into it.</p>
 
     <p>Regards,<br>
     Felix Tools Private Limited</p>
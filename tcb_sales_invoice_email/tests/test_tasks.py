@@ -0,0 +1,44 @@
+# Copyright (c) 2026, Vaibhav and contributors
+# For license information, please see license.txt
+
+from collections import Counter
+
+from frappe.tests.utils import FrappeTestCase
+
+from tcb_sales_invoice_email.tasks import get_reminder_cohort, is_customer_due_for_reminder
+
+CUSTOMERS = [f"CUST-{idx:05d}" for idx in range(4000)]
+
+
+class TestReminderCohorts(FrappeTestCase):
+	def test_cohort_is_stable(self):
+		for customer in CUSTOMERS[:100]:
+			self.assertEqual(get_reminder_cohort(customer, 4), get_reminder_cohort(customer, 4))
+			self.assertIn(get_reminder_cohort(customer, 4), range(4))
+
+	def test_customer_due_once_per_cadence(self):
+		day_number = 739000
+		for cadence in (1, 3, 4, 7):
+			for customer in CUSTOMERS[:100]:
+				due_days = [
+					day
+					for day in range(day_number, day_number + cadence)
+					if is_customer_due_for_reminder(customer, cadence, day)
+				]
+				self.assertEqual(len(due_days), 1)
+
+	def test_customers_spread_evenly_across_cadence(self):
+		day_number = 739000
+		for cadence in (3, 4, 7):
+			due_per_day = Counter(
+				day
+				for day in range(day_number, day_number + cadence)
+				for customer in CUSTOMERS
+				if is_customer_due_for_reminder(customer, cadence, day)
+			)
+			expected = len(CUSTOMERS) / cadence
+			for day in range(day_number, day_number + cadence):
+				self.assertAlmostEqual(due_per_day[day], expected, delta=expected * 0.1)
+
+	def test_invalid_cadence_falls_back_to_daily(self):
+		self.assertTrue(is_customer_due_for_reminder("CUST-00001", 0, 739000))